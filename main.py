@@ -5,29 +5,92 @@
 # - Core Logic: Robust v0.3.8 architecture (Reliable clipboard, no sudo hacks).
 # - CLI Features: Restored v0.2.1 arguments (--list, --device, --verbose).
 # - Fix v0.4.2: Handles trailing spaces correctly (treats space as a normal symbol).
+# - v0.4.3: Last-word fix replays buffered keystrokes (no clipboard round-trip).
 
+import os
+import re
+import fcntl
+import math
 import sys
 import time
+import select
+import signal
+import struct
+from array import array
 import logging
 import subprocess
 import argparse
+from collections import deque, namedtuple
+from functools import lru_cache, partial
+from itertools import islice
 from evdev import InputDevice, UInput, ecodes as e, list_devices
 
 # --- Configuration ---
 VERSION = "0.4.3"
 DOUBLE_PRESS_DELAY = 0.5
+DOUBLE_PRESS_DELAY_NS = int(DOUBLE_PRESS_DELAY * 1e9)
+TYPING_TIMEOUT = 3.0  # Pause (sec) after which the typed-word buffer is reset
+TYPING_TIMEOUT_NS = int(TYPING_TIMEOUT * 1e9)
 LAYOUT_SWITCH_COMBO = [e.KEY_LEFTMETA, e.KEY_SPACE]
+RELEASE_MODIFIERS = [e.KEY_LEFTSHIFT, e.KEY_RIGHTSHIFT, e.KEY_LEFTCTRL, e.KEY_RIGHTCTRL, e.KEY_LEFTALT]
+COMBO_HOLD_TIME = 0.005  # Enough for X/Wayland to register the press order
+LAYOUT_SWITCH_SETTLE_TIME = 0.15  # Let the OS flip the layout before replaying
+SETTLE_DELAY = 0.0  # Extra pause between correction steps, for slow apps (--settle-delay)
+REPLAY_DELAY = 0.0  # Per-key pause when retyping; 0 sends the word in one burst (--replay-delay)
+RELEASE_WAIT_TIMEOUT = 1.0  # Longest wait for the trigger chord to be let go before injecting
+RELEASE_POLL_INTERVAL = 0.005
+# --fast preset: the two fixed sleeps above are the bulk of a correction's latency.
+# The hold is 1ms, not 20ms: the default hold here is already 5ms, so 20ms
+# would make --fast slower
+FAST_COMBO_HOLD_TIME = 0.001
+FAST_LAYOUT_SWITCH_SETTLE_TIME = 0.05
+MAX_BUFFER_SIZE = 100  # Keystrokes remembered by InputBuffer
+TRANSLATE_CACHE_MAX_LEN = 128  # Longer selections are translated without caching
+EVENT_BATCH_SIZE = 64  # Max input events drained per read() syscall
+
+# Kernel struct input_event: struct timeval, __u16 type, __u16 code, __s32 value
+INPUT_EVENT = struct.Struct('llHHi')
+# struct input_mask {__u32 type; __u32 codes_size; __u64 codes_ptr;}, type 0 masks event types
+EVIOCSMASK_ARG = struct.Struct('IIQ')
+EVIOCSMASK = 0x40104593  # _IOW('E', 0x93, struct input_mask)
+EVIOCSCLOCKID = 0x400445a0  # _IOW('E', 0xa0, int)
+
+
+def pack_key(code, value):
+    """Raw EV_KEY record for writing straight to the uinput fd (uinput sets the time)."""
+    return INPUT_EVENT.pack(0, 0, e.EV_KEY, code, value)
+
+
+SYN_FRAME_END = INPUT_EVENT.pack(0, 0, e.EV_SYN, e.SYN_REPORT, 0)
+BACKSPACE_FRAME = pack_key(e.KEY_BACKSPACE, 1) + pack_key(e.KEY_BACKSPACE, 0) + SYN_FRAME_END
+
+# Held modifiers are tracked as a bitmask: RELEASE_MODIFIERS take the low bits,
+# so the release write for every one of their masks is prebuilt, indexed by
+# the mask itself. AltGr and Meta are only tracked to recognise shortcuts
+TRACKED_MODIFIERS = [*RELEASE_MODIFIERS, e.KEY_RIGHTALT, e.KEY_LEFTMETA, e.KEY_RIGHTMETA]
+TRACKED_MODIFIER_SET = frozenset(TRACKED_MODIFIERS)
+MODIFIER_BITS = {key: 1 << i for i, key in enumerate(TRACKED_MODIFIERS)}
+RELEASE_MASK = (1 << len(RELEASE_MODIFIERS)) - 1
+SHIFT_MASK = MODIFIER_BITS[e.KEY_LEFTSHIFT] | MODIFIER_BITS[e.KEY_RIGHTSHIFT]
+# Any of these held turns a key into a shortcut (Ctrl+V, AltGr chords), not text
+CHORD_MASK = ((1 << len(TRACKED_MODIFIERS)) - 1) & ~SHIFT_MASK
+MODIFIER_RELEASE_FRAMES = tuple(
+    b''.join(pack_key(key, 0) for key, bit in MODIFIER_BITS.items() if mask & bit) + SYN_FRAME_END
+    for mask in range(RELEASE_MASK + 1)
+)
+
+
+@lru_cache(maxsize=None)
+def combo_frames(keys):
+    """(press, release) frames for a shortcut; built once per distinct combo."""
+    press = b''.join(pack_key(k, 1) for k in keys) + SYN_FRAME_END
+    release = b''.join(pack_key(k, 0) for k in reversed(keys)) + SYN_FRAME_END
+    return press, release
 
 
 # --- Logging Setup ---
-class EmojiFormatter(logging.Formatter):
-    def format(self, record):
-        log_time = time.strftime("%H:%M:%S", time.localtime(record.created))
-        return f"[{log_time}] {record.getMessage()}"
-
-
 handler = logging.StreamHandler(sys.stdout)
-handler.setFormatter(EmojiFormatter())
+handler.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", datefmt="%H:%M:%S"))
 logger = logging.getLogger("SkySwitcher")
 logger.addHandler(handler)
 # Note: Level is set in __main__ based on arguments
@@ -41,6 +104,87 @@ LAYOUTS_DB = {
     'ua': LAYOUT_UA,
 }
 
+LayoutPair = namedtuple(
+    'LayoutPair', 'map_src_to_dst map_dst_to_src src_unique dst_unique score_table ascii_is_src changing_chars')
+
+
+@lru_cache(maxsize=16)
+def build_layout_pair(src_name, dst_name):
+    """Translation and scoring tables for a layout pair; immutable, so shared."""
+    src, dst = LAYOUTS_DB[src_name], LAYOUTS_DB[dst_name]
+    map_src_to_dst = str.maketrans(src, dst)
+    if src.isascii():
+        # Flat 128-entry tuple indexed by ordinal; chars >= 128 raise
+        # IndexError and translate() leaves them as is
+        map_src_to_dst = tuple(map_src_to_dst.get(i, chr(i)) for i in range(128))
+    src_unique = frozenset(src) - frozenset(dst)
+    dst_unique = frozenset(dst) - frozenset(src)
+    # Scoring table: src-unique chars are deleted and dst-unique chars doubled,
+    # so one translate() pass changes the length by (dst_count - src_count), in C
+    score_table = {**dict.fromkeys(map(ord, src_unique)), **{ord(c): c * 2 for c in dst_unique}}
+    return LayoutPair(
+        map_src_to_dst=map_src_to_dst,
+        map_dst_to_src=str.maketrans(dst, src),
+        src_unique=src_unique,
+        dst_unique=dst_unique,
+        score_table=score_table,
+        # No dst-unique char is ASCII, so ASCII text always reads as src
+        ascii_is_src=not any(c.isascii() for c in dst_unique),
+        # Chars that translate to something else in either direction
+        changing_chars=frozenset(a for a, b in zip(src + dst, dst + src) if a != b),
+    )
+
+
+# --- Key Map (US layout, used for logging replayed keys) ---
+KEY_MAP = {
+    e.KEY_GRAVE: '`', e.KEY_1: '1', e.KEY_2: '2', e.KEY_3: '3', e.KEY_4: '4',
+    e.KEY_5: '5', e.KEY_6: '6', e.KEY_7: '7', e.KEY_8: '8', e.KEY_9: '9',
+    e.KEY_0: '0', e.KEY_MINUS: '-', e.KEY_EQUAL: '=',
+    e.KEY_Q: 'q', e.KEY_W: 'w', e.KEY_E: 'e', e.KEY_R: 'r', e.KEY_T: 't',
+    e.KEY_Y: 'y', e.KEY_U: 'u', e.KEY_I: 'i', e.KEY_O: 'o', e.KEY_P: 'p',
+    e.KEY_LEFTBRACE: '[', e.KEY_RIGHTBRACE: ']', e.KEY_BACKSLASH: '\\',
+    e.KEY_A: 'a', e.KEY_S: 's', e.KEY_D: 'd', e.KEY_F: 'f', e.KEY_G: 'g',
+    e.KEY_H: 'h', e.KEY_J: 'j', e.KEY_K: 'k', e.KEY_L: 'l',
+    e.KEY_SEMICOLON: ';', e.KEY_APOSTROPHE: "'",
+    e.KEY_Z: 'z', e.KEY_X: 'x', e.KEY_C: 'c', e.KEY_V: 'v', e.KEY_B: 'b',
+    e.KEY_N: 'n', e.KEY_M: 'm', e.KEY_COMMA: ',', e.KEY_DOT: '.', e.KEY_SLASH: '/',
+    e.KEY_SPACE: ' ',
+}
+
+
+SHIFT_PUNCT = {
+    '`': '~', '1': '!', '2': '@', '3': '#', '4': '$', '5': '%',
+    '6': '^', '7': '&', '8': '*', '9': '(', '0': ')', '-': '_',
+    '=': '+', '[': '{', ']': '}', '\\': '|', ';': ':', "'": '"',
+    ',': '<', '.': '>', '/': '?',
+}
+KEY_MAP_SHIFT = {
+    code: char.upper() if char.isalpha() else SHIFT_PUNCT.get(char, char)
+    for code, char in KEY_MAP.items()
+}
+
+
+def _char_table(key_map):
+    # Flat keycode -> ASCII byte table, '?' for keys the map doesn't cover
+    table = bytearray(b'?' * 256)
+    for code, char in key_map.items():
+        table[code] = ord(char)
+    return bytes(table)
+
+
+# Indexed by the shift flag: KEY_TABLES[False] plain, KEY_TABLES[True] shifted
+KEY_TABLES = (_char_table(KEY_MAP), _char_table(KEY_MAP_SHIFT))
+
+# Prebuilt press+release+SYN frame for every key the buffer can hold, and the
+# Shift toggles replay_keys() wraps around shifted runs
+TAP_FRAMES = {code: pack_key(code, 1) + pack_key(code, 0) + SYN_FRAME_END for code in KEY_MAP}
+SHIFT_FRAMES = (pack_key(e.KEY_LEFTSHIFT, 0), pack_key(e.KEY_LEFTSHIFT, 1))
+
+
+def decode_keys(key_list):
+    """Renders buffered (keycode, shifted) pairs as US-layout text."""
+    return bytes(KEY_TABLES[shifted][code] for code, shifted in key_list).decode('ascii')
+
 
 class DeviceManager:
     IGNORED_KEYWORDS = [
@@ -48,80 +192,358 @@ class DeviceManager:
         'control', 'headset', 'receiver', 'solaar', 'hotkeys',
         'button', 'switch', 'hda', 'dock'
     ]
-    REQUIRED_KEYS = {e.KEY_SPACE, e.KEY_ENTER, e.KEY_A, e.KEY_Z}
+    # One case-insensitive regex pass per device name: no substring scan per
+    # keyword and no lower() copy of the name
+    _IGNORED_RE = re.compile('|'.join(map(re.escape, IGNORED_KEYWORDS)), re.IGNORECASE)
+    _KEYBOARD_RE = re.compile('keyboard|kbd', re.IGNORECASE)
+    REQUIRED_KEYS = frozenset({e.KEY_SPACE, e.KEY_ENTER, e.KEY_A, e.KEY_Z})
+    _DIGITS_RE = re.compile(r'(\d+)')
+
+    @staticmethod
+    def _path_sort_key(path):
+        # Numeric order, so event10 sorts after event9 rather than after event1
+        return [int(part) if part.isdigit() else part for part in DeviceManager._DIGITS_RE.split(path)]
 
     @staticmethod
     def list_available():
         """Prints all available input devices for debugging."""
-        devices = []
         try:
-            devices = [InputDevice(path) for path in list_devices()]
+            paths = sorted(list_devices(), key=DeviceManager._path_sort_key)
         except OSError:
             print("❌ Failed to list devices. Check permissions.", file=sys.stderr)
             return
 
-        devices.sort(key=lambda x: x.path)
         print(f"{'PATH':<20} | {'NAME'}")
         print("-" * 60)
-        for dev in devices:
+        # Open one device at a time and close it right after printing
+        for path in paths:
+            try:
+                dev = InputDevice(path)
+            except OSError:
+                continue
             print(f"{dev.path:<20} | {dev.name}")
+            dev.close()
+
+    @staticmethod
+    def mask_non_key_events(dev):
+        """Asks evdev to deliver only EV_KEY (and SYN) records to our fd."""
+        # Drops the EV_MSC scancode sent with every key press before it is
+        # copied to us. Best effort: EVIOCSMASK needs Linux 4.4+.
+        types = array('L', [1 << e.EV_KEY])
+        request = EVIOCSMASK_ARG.pack(0, types.itemsize, types.buffer_info()[0])
+        try:
+            fcntl.ioctl(dev.fd, EVIOCSMASK, request)
+        except OSError as err:
+            logger.debug("EVIOCSMASK unavailable (%s), filtering events in Python", err)
+
+    @staticmethod
+    def use_monotonic_timestamps(dev):
+        """Switches event timestamps from wall-clock to CLOCK_MONOTONIC."""
+        try:
+            fcntl.ioctl(dev.fd, EVIOCSCLOCKID, struct.pack('i', time.CLOCK_MONOTONIC))
+        except OSError as err:
+            logger.debug("EVIOCSCLOCKID failed (%s), timestamps stay wall-clock", err)
 
     @staticmethod
     def find_keyboard() -> InputDevice:
-        devices = []
         try:
-            devices = [InputDevice(path) for path in list_devices()]
+            paths = sorted(list_devices(), key=DeviceManager._path_sort_key)
         except OSError:
             logger.error(
                 "❌ Failed to list devices. Do you have permission? (Try adding user to 'input' group or use sudo)")
             sys.exit(1)
 
-        devices.sort(key=lambda x: x.path)
         possible_candidates = []
+        keyboard = None
 
-        for dev in devices:
-            name_lower = dev.name.lower()
-            if any(bad in name_lower for bad in DeviceManager.IGNORED_KEYWORDS):
+        # Devices are opened one by one; rejected ones are closed immediately
+        for path in paths:
+            try:
+                dev = InputDevice(path)
+            except OSError:
                 continue
 
-            if e.EV_KEY not in dev.capabilities():
+            keys = None
+            if not DeviceManager._IGNORED_RE.search(dev.name):
+                keys = dev.capabilities(absinfo=False).get(e.EV_KEY)
+
+            if not keys or not DeviceManager.REQUIRED_KEYS.issubset(keys):
+                dev.close()
                 continue
 
-            supported_keys = set(dev.capabilities()[e.EV_KEY])
-            if DeviceManager.REQUIRED_KEYS.issubset(supported_keys):
-                if 'keyboard' in name_lower or 'kbd' in name_lower:
-                    logger.info(f"✅ Auto-detected: {dev.name}")
-                    return dev
-                possible_candidates.append(dev)
+            if DeviceManager._KEYBOARD_RE.search(dev.name):
+                logger.info(f"✅ Auto-detected: {dev.name}")
+                keyboard = dev
+                break
+            possible_candidates.append(dev)
 
-        if possible_candidates:
-            logger.info(f"✅ Auto-detected (best guess): {possible_candidates[0].name}")
-            return possible_candidates[0]
+        if keyboard is None and possible_candidates:
+            keyboard = possible_candidates[0]
+            logger.info(f"✅ Auto-detected (best guess): {keyboard.name}")
 
-        logger.error("❌ No suitable keyboard found! Use --list to find it manually.")
-        sys.exit(1)
+        for dev in possible_candidates:
+            if dev is not keyboard:
+                dev.close()
 
+        if keyboard is None:
+            logger.error("❌ No suitable keyboard found! Use --list to find it manually.")
+            sys.exit(1)
+        return keyboard
+
+
+# InputBuffer key classes; 0 means the key doesn't touch the buffer
+KEY_CLASS_RESET, KEY_CLASS_ERASE, KEY_CLASS_TYPED = 1, 2, 3
+
+
+def key_class_table(classes):
+    """Flat keycode -> class byte table, so classifying a key is one index."""
+    table = bytearray(e.KEY_MAX + 1)
+    for cls, codes in classes.items():
+        for code in codes:
+            table[code] = cls
+    return bytes(table)
+
+
+class InputBuffer:
+    """Remembers physical keystrokes of the current word so they can be replayed."""
+
+    # Keys that move the cursor or change focus: buffer no longer matches screen
+    RESET_KEYS = frozenset({
+        e.KEY_ENTER, e.KEY_KPENTER, e.KEY_TAB, e.KEY_ESC,
+        e.KEY_UP, e.KEY_DOWN, e.KEY_LEFT, e.KEY_RIGHT,
+        e.KEY_HOME, e.KEY_END, e.KEY_PAGEUP, e.KEY_PAGEDOWN, e.KEY_DELETE,
+        e.KEY_LEFTCTRL, e.KEY_RIGHTCTRL, e.KEY_LEFTALT, e.KEY_RIGHTALT,
+        e.KEY_LEFTMETA, e.KEY_RIGHTMETA,
+    })
+    # Only keys that actually type a character (KEY_MAP includes SPACE)
+    TRACKABLE_KEYS = frozenset(KEY_MAP)
+
+    # One byte lookup per keystroke instead of a set hash per category
+    _KEY_CLASS = key_class_table({
+        KEY_CLASS_RESET: RESET_KEYS,
+        KEY_CLASS_ERASE: (e.KEY_BACKSPACE,),
+        KEY_CLASS_TYPED: TRACKABLE_KEYS,
+    })
 
-class TextProcessor:
     def __init__(self):
-        self.src_chars = LAYOUTS_DB['us']
-        self.dst_chars = LAYOUTS_DB['ua']
-        self.map_src_to_dst = str.maketrans(self.src_chars, self.dst_chars)
-        self.map_dst_to_src = str.maketrans(self.dst_chars, self.src_chars)
-        self.src_unique = set(self.src_chars) - set(self.dst_chars)
-        self.dst_unique = set(self.dst_chars) - set(self.src_chars)
-        logger.info("🌍 Languages: US <-> UA")
+        self.buffer = deque(maxlen=MAX_BUFFER_SIZE)
+        self.last_key_time = time.monotonic_ns()
+        # Index of the first key of the last word (None: no word in buffer).
+        # Kept up to date in add(); only a backspace into the previous word
+        # marks it stale and forces a rescan.
+        self.word_start = None
+        self.word_start_stale = False
+        # Set once maxlen has dropped a key: text before buffer[0] is unknown
+        self.overflowed = False
+
+    def clear(self):
+        self.buffer.clear()
+        self.word_start = None
+        self.word_start_stale = False
+        self.overflowed = False
+
+    def add(self, keycode, is_shifted):
+        # Monotonic like the double-press timer, so clock jumps can't clear the buffer
+        now = time.monotonic_ns()
+        if now - self.last_key_time > TYPING_TIMEOUT_NS:
+            self.clear()
+        self.last_key_time = now
+
+        key_class = self._KEY_CLASS[keycode]
+
+        if key_class == KEY_CLASS_RESET:
+            self.clear()
+
+        elif key_class == KEY_CLASS_ERASE:
+            if self.buffer:
+                self.buffer.pop()
+                if self.word_start is not None and self.word_start >= len(self.buffer):
+                    self.word_start_stale = True
+
+        elif key_class == KEY_CLASS_TYPED:
+            starts_word = keycode != e.KEY_SPACE and (not self.buffer or self.buffer[-1][0] == e.KEY_SPACE)
+            if len(self.buffer) == MAX_BUFFER_SIZE:
+                self.overflowed = True
+                if self.word_start:
+                    self.word_start -= 1  # The append below evicts index 0
+            # maxlen evicts the oldest entry in O(1)
+            self.buffer.append((keycode, is_shifted))
+            if starts_word:
+                self.word_start = len(self.buffer) - 1
+                self.word_start_stale = False
+
+    def _find_word_start(self):
+        start = len(self.buffer)
+        found_char = False
+        for code, _ in reversed(self.buffer):
+            if code == e.KEY_SPACE:
+                if found_char:
+                    break
+            else:
+                found_char = True
+            start -= 1
+        return start if found_char else None
+
+    def get_last_phrase(self):
+        """Returns the last word together with any spaces typed after it."""
+        if self.word_start_stale:
+            self.word_start = self._find_word_start()
+            self.word_start_stale = False
+        if self.word_start is None:
+            return []
+        if self.word_start == 0 and self.overflowed:
+            # The word may have begun before the oldest kept key; retyping a
+            # tail of it would leave the start in the wrong layout
+            logger.debug("⚠️ Word longer than the buffer, not fixing it.")
+            return []
+        return list(islice(self.buffer, self.word_start, None))
+
+
+class TextProcessor:
+    def __init__(self, src_name='us', dst_name='ua'):
+        self.src_chars = LAYOUTS_DB[src_name]
+        self.dst_chars = LAYOUTS_DB[dst_name]
+        (self.map_src_to_dst, self.map_dst_to_src, self.src_unique, self.dst_unique,
+         self.score_table, self.ascii_is_src, self.changing_chars) = build_layout_pair(src_name, dst_name)
+        # Per-instance cache: lru_cache on the method itself would be shared
+        # by the class and keep every instance alive
+        self._translate_cached = lru_cache(maxsize=512)(self._translate)
+        logger.info("🌍 Languages: %s <-> %s", src_name.upper(), dst_name.upper())
 
     def smart_translate(self, text):
-        src_score = sum(1 for c in text if c in self.src_unique)
-        dst_score = sum(1 for c in text if c in self.dst_unique)
-        if src_score >= dst_score:
+        # Re-fixing the same short selection is a cache hit
+        if len(text) <= TRANSLATE_CACHE_MAX_LEN:
+            return self._translate_cached(text)
+        return self._translate(text)
+
+    def _translate(self, text):
+        # Digits, spaces, foreign text: nothing would change, skip the copy.
+        # isdisjoint() stops at the first translatable char.
+        if self.changing_chars.isdisjoint(text):
+            return text
+        # isascii() reads a flag on the str object, no scan needed
+        if self.ascii_is_src and text.isascii():
+            return text.translate(self.map_src_to_dst)
+
+        # Not longer after scoring: at least as many src-unique chars as dst-unique
+        if len(text.translate(self.score_table)) <= len(text):
             return text.translate(self.map_src_to_dst)
         return text.translate(self.map_dst_to_src)
 
 
+class ClipboardWatcher:
+    """Streams clipboard changes from one long-lived `wl-paste --watch` process."""
+
+    # wl-paste runs the command on every selection change with the content on
+    # stdin; a NUL byte (never valid in text/plain) terminates each payload.
+    WATCH_CMD = ['wl-paste', '--type', 'text', '--watch', 'sh', '-c', 'cat; printf "\\0"']
+
+    def __init__(self):
+        self.proc = None
+        self.fd = None
+        self._pending = b""
+        # Newest complete selection seen on the pipe (None until one arrives)
+        self.latest = None
+        self._stale = False
+        # True once an event loop pumps the pipe on every wakeup (see register)
+        self.tracked = False
+        try:
+            self.proc = subprocess.Popen(self.WATCH_CMD, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        except OSError:
+            logger.warning("⚠️ wl-paste --watch unavailable. Falling back to clipboard polling.")
+            return
+        self.fd = self.proc.stdout.fileno()
+        os.set_blocking(self.fd, False)
+
+    @property
+    def active(self):
+        return self.proc is not None
+
+    @property
+    def current_selection(self):
+        """`latest`, but only while it is kept current by continuous pumping."""
+        if self.active and self.tracked:
+            return self.latest
+        return None
+
+    def register(self, poller):
+        """Adds the pipe to an epoll set; the caller must pump() when it's readable."""
+        if not self.active:
+            return None
+        poller.register(self.fd, select.EPOLLIN)
+        self.tracked = True
+        return self.fd
+
+    def _read_available(self):
+        """Appends whatever the pipe holds to the pending buffer; False if nothing."""
+        try:
+            chunk = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return False
+        if not chunk:
+            logger.warning("⚠️ wl-paste --watch exited. Falling back to clipboard polling.")
+            self.close()
+            return False
+        self._pending += chunk
+        return True
+
+    def _consume(self):
+        """Reads the pipe dry and keeps only the newest complete payload."""
+        while self.active and self._read_available():
+            pass
+        # Everything before the last NUL is complete; remember the newest
+        complete, sep, self._pending = self._pending.rpartition(b"\0")
+        for payload in reversed(complete.split(b"\0")):
+            if payload:
+                self.latest = payload
+                break
+        if sep:
+            self._stale = False  # Any stale partial has completed by now
+
+    def pump(self):
+        """Called on every event-loop wakeup for our fd, so the pipe never fills
+        up and `latest` follows the user's copies between corrections."""
+        self._consume()
+
+    def drain(self):
+        """Discards notifications that arrived before the copy we are waiting for."""
+        self._consume()
+        # A payload still being written predates the copy as well: keep it so
+        # it completes intact, but don't hand it out as new content
+        self._stale = bool(self._pending)
+
+    def wait_for_content(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            while b"\0" in self._pending:
+                payload, _, self._pending = self._pending.partition(b"\0")
+                stale, self._stale = self._stale, False
+                if payload:
+                    self.latest = payload
+                    if not stale:
+                        return payload
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.active:
+                return None
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            if ready:
+                self._read_available()
+
+    def close(self):
+        if self.proc is None:
+            return
+        self.proc.terminate()
+        self.proc.stdout.close()
+        self.proc.wait()
+        self.proc = None
+        self.latest = None  # No longer kept current
+
+
 class SkySwitcher:
-    def __init__(self, device_path=None):
+    def __init__(self, device_path=None, settle_delay=SETTLE_DELAY,
+                 press_duration=COMBO_HOLD_TIME, switch_settle_time=LAYOUT_SWITCH_SETTLE_TIME,
+                 replay_delay=REPLAY_DELAY):
         # Device Selection Logic
         if device_path:
             try:
@@ -134,11 +556,11 @@ class SkySwitcher:
             self.device = DeviceManager.find_keyboard()
 
         # Virtual Input Setup
-        self.uinput_keys = [
-            e.KEY_LEFTCTRL, e.KEY_LEFTSHIFT, e.KEY_RIGHTCTRL, e.KEY_RIGHTSHIFT,
-            e.KEY_C, e.KEY_V, e.KEY_LEFT, e.KEY_RIGHT, e.KEY_BACKSPACE,
-            e.KEY_HOME, e.KEY_LEFTMETA, e.KEY_SPACE, e.KEY_LEFTALT
-        ]
+        # Declare exactly the keys we emit: modifier resets, backspace, the
+        # layout combo and the typeable keys (C/V for copy-paste included)
+        self.uinput_keys = sorted({
+            *RELEASE_MODIFIERS, e.KEY_BACKSPACE, *LAYOUT_SWITCH_COMBO, *KEY_MAP
+        })
 
         self.ui = None
         try:
@@ -147,9 +569,21 @@ class SkySwitcher:
             logger.error("❌ Failed to create UInput device. Check permissions for /dev/uinput.")
             sys.exit(1)
 
+        self.settle_delay = settle_delay
+        self.press_duration = press_duration
+        self.switch_settle_time = switch_settle_time
+        self.replay_delay = replay_delay
         self.processor = TextProcessor()
+        self.clipboard = ClipboardWatcher()
+        self.input_buffer = InputBuffer()
         self.last_press_time = 0
         self.modifier_down = False
+        # Run in forked wl-copy/wl-paste before exec; see raise_priority()
+        self.child_preexec = None
+        # Physically held TRACKED_MODIFIERS as MODIFIER_BITS. release_all_modifiers()
+        # releases the RELEASE_MASK part on the virtual device only, which can't
+        # lift the physical keys; wait_for_physical_release() waits those out
+        self.held_modifiers = 0
 
         # New flag to track if trigger was physically released
         self.trigger_released = True
@@ -157,170 +591,321 @@ class SkySwitcher:
         self.trigger_btn = e.KEY_RIGHTSHIFT
         self.mode2_modifier = e.KEY_RIGHTCTRL
 
-    def send_combo(self, *keys):
-        for k in keys:
-            self.ui.write(e.EV_KEY, k, 1)
-
-        self.ui.syn()
-        time.sleep(0.02)
-
-        for k in reversed(keys):
-            self.ui.write(e.EV_KEY, k, 0)
+        # Keycode -> handler(code, value, sec, usec); everything else goes to _on_key
+        self._handlers = {
+            self.trigger_btn: self._on_trigger,
+            self.mode2_modifier: self._on_mode2_modifier,
+            e.KEY_LEFTSHIFT: self._on_shift,
+        }
+        for key in TRACKED_MODIFIERS:
+            self._handlers.setdefault(key, self._on_modifier)
 
-        self.ui.syn()
-        time.sleep(0.02)
+    def send_combo(self, *keys):
+        # All presses form one frame, all releases another
+        press, release = combo_frames(keys)
+        os.write(self.ui.fd, press)
+        time.sleep(self.press_duration)
+        os.write(self.ui.fd, release)
 
     def release_all_modifiers(self):
-        modifiers = [e.KEY_LEFTSHIFT, e.KEY_RIGHTSHIFT, e.KEY_LEFTCTRL, e.KEY_RIGHTCTRL, e.KEY_LEFTALT]
-        for key in modifiers:
-            self.ui.write(e.EV_KEY, key, 0)
-        self.ui.syn()
-        time.sleep(0.05)
+        # Nothing held means nothing to release and no need to settle
+        held = self.held_modifiers & RELEASE_MASK
+        if not held:
+            return
+        os.write(self.ui.fd, MODIFIER_RELEASE_FRAMES[held])
+        self.settle()
+
+    def wait_for_physical_release(self):
+        # uinput can't lift keys it never pressed: with the trigger (or the
+        # mode-2 modifier) still down, the layout switch would arrive as
+        # Shift+Meta+Space and the copy as Ctrl+Shift+C. The kernel's key
+        # state is ahead of the events run() has read, so poll that instead
+        deadline = time.monotonic() + RELEASE_WAIT_TIMEOUT
+        while TRACKED_MODIFIER_SET.intersection(self.device.active_keys()):
+            if time.monotonic() >= deadline:
+                logger.debug("Modifiers still held, injecting anyway")
+                return
+            time.sleep(RELEASE_POLL_INTERVAL)
 
+    def settle(self):
+        if self.settle_delay:
+            time.sleep(self.settle_delay)
+
+    # Explicit types skip wl-copy's mime sniffing, which costs ~50ms per call
+    # Clipboard content stays raw bytes; only the text we translate is decoded
     def get_clipboard(self):
         try:
-            return subprocess.run(['wl-paste', '-n'], capture_output=True, text=True).stdout
+            return subprocess.run(['wl-paste', '-n', '--type', 'text'], capture_output=True,
+                                  preexec_fn=self.child_preexec).stdout
         except Exception:
-            return ""
+            return b""
 
-    def set_clipboard(self, text):
+    def set_clipboard(self, data):
         try:
-            p = subprocess.Popen(['wl-copy', '-n'], stdin=subprocess.PIPE, text=True)
-            p.communicate(input=text)
+            p = subprocess.Popen(['wl-copy', '-n', '--type', 'text/plain'], stdin=subprocess.PIPE,
+                                 preexec_fn=self.child_preexec)
+            p.communicate(input=data)
         except Exception:
             pass
 
     def wait_for_new_content(self, timeout=0.5):
-        start = time.time()
-        while time.time() - start < timeout:
+        # Event-driven path: block on the watcher pipe instead of forking wl-paste
+        if self.clipboard.active:
+            return self.clipboard.wait_for_content(timeout)
+
+        # Monotonic like ClipboardWatcher.wait_for_content(): a clock step
+        # can't stretch or cut the polling window
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
             content = self.get_clipboard()
             if content:
                 return content
             time.sleep(0.02)
         return None
 
-    def process_correction(self, mode="last_word"):
+    def replay_keys(self, keys):
+        # Pack the whole replay into raw input_event records and hand it to
+        # uinput in a single write(); the kernel injects them in order.
+        # Shift is held across a run of shifted keys instead of per key.
+        taps, shift_frames = TAP_FRAMES, SHIFT_FRAMES  # Loop-local lookups
+        chunks = []
+        shift_held = False
+        for code, shifted in keys:
+            if shifted != shift_held:
+                chunks.append(shift_frames[shifted] + taps[code])
+                shift_held = shifted
+            else:
+                chunks.append(taps[code])
+        if shift_held:
+            chunks.append(shift_frames[False] + SYN_FRAME_END)
+
+        if not self.replay_delay:
+            os.write(self.ui.fd, b''.join(chunks))
+            return
+        # Paced fallback for apps that drop keys arriving in one burst
+        for chunk in chunks:
+            os.write(self.ui.fd, chunk)
+            time.sleep(self.replay_delay)
+
+    def fix_last_word(self):
+        keys_to_replay = self.input_buffer.get_last_phrase()
+        if not keys_to_replay:
+            logger.debug("⚠️ Buffer empty, nothing to fix.")
+            return
+
+        # decode_keys() is only worth running when the line will be printed
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Replaying: '%s'", decode_keys(keys_to_replay))
+        self.wait_for_physical_release()
         self.release_all_modifiers()
-        time.sleep(0.15)
 
-        backup_clipboard = self.get_clipboard()
-        subprocess.run(['wl-copy', '--clear'], check=False)
+        # All backspace frames in one write(), same as the replay below
+        os.write(self.ui.fd, BACKSPACE_FRAME * len(keys_to_replay))
 
-        if mode == "last_word":
-            self.send_combo(e.KEY_LEFTSHIFT, e.KEY_HOME)
-            self.release_all_modifiers()
-            time.sleep(0.1)
-            self.send_combo(e.KEY_LEFTCTRL, e.KEY_C)
-        else:
-            self.send_combo(e.KEY_LEFTCTRL, e.KEY_C)
+        logger.info("Switching system layout...")
+        self.send_combo(*LAYOUT_SWITCH_COMBO)
+        time.sleep(self.switch_settle_time)
 
-        full_text = self.wait_for_new_content()
+        # Same physical keys in the new layout produce the intended text
+        self.replay_keys(keys_to_replay)
 
-        if not full_text:
-            logger.debug("⚠️ Copy failed/empty.")
-            self.set_clipboard(backup_clipboard)
-            if mode == "last_word":
-                self.send_combo(e.KEY_RIGHT)
-            return
+    def fix_selection(self):
+        self.wait_for_physical_release()
+        self.release_all_modifiers()
 
-        target_text = full_text
-        trailing_spaces_count = 0
+        # A watcher pumped by run() has already seen the current selection;
+        # only fork wl-paste when it isn't tracked or nothing arrived yet
+        self.clipboard.drain()
+        backup_clipboard = self.clipboard.current_selection
+        if backup_clipboard is None:
+            backup_clipboard = self.get_clipboard()
+        subprocess.run(['wl-copy', '--clear'], check=False, preexec_fn=self.child_preexec)
+        self.send_combo(e.KEY_LEFTCTRL, e.KEY_C)
 
-        if mode == "last_word":
-            if not full_text.strip():
-                self.set_clipboard(backup_clipboard)
-                self.send_combo(e.KEY_RIGHT)
-                return
+        selected = self.wait_for_new_content()
 
-            # Logic update: Handle trailing spaces correctly
-            full_text_stripped = full_text.rstrip()
-            trailing_spaces_count = len(full_text) - len(full_text_stripped)
-            target_text = full_text_stripped.split()[-1]
+        if not selected:
+            logger.debug("⚠️ Copy failed/empty.")
+            self.set_clipboard(backup_clipboard)
+            return
 
-        converted = self.processor.smart_translate(target_text)
+        try:
+            selected_text = selected.decode("utf-8")
+        except UnicodeDecodeError:
+            # Pasting a lossy decode back would damage the selection
+            logger.debug("⚠️ Copy failed: selection is not UTF-8 text.")
+            self.set_clipboard(backup_clipboard)
+            return
+        converted = self.processor.smart_translate(selected_text)
 
-        if target_text == converted:
+        if selected_text == converted:
             logger.debug("No change needed.")
-            if mode == "last_word":
-                self.send_combo(e.KEY_RIGHT)
             return
 
-        # Restore trailing spaces to the converted text
-        final_text = converted + (" " * trailing_spaces_count)
-
-        logger.info(f"Correcting: '{target_text}' -> '{converted}' (spaces: {trailing_spaces_count})")
-        self.set_clipboard(final_text)
-        time.sleep(0.1)
-
-        if mode == "last_word":
-            self.send_combo(e.KEY_RIGHT)
-            # Delete word length AND trailing spaces
-            total_backspaces = len(target_text) + trailing_spaces_count
-            for _ in range(total_backspaces):
-                self.ui.write(e.EV_KEY, e.KEY_BACKSPACE, 1)
-                self.ui.syn()
-                time.sleep(0.005)
-                self.ui.write(e.EV_KEY, e.KEY_BACKSPACE, 0)
-                self.ui.syn()
-        else:
-            self.send_combo(e.KEY_BACKSPACE)
+        logger.info("Correcting: '%s' -> '%s'", selected_text, converted)
+        self.clipboard.drain()
+        self.set_clipboard(converted.encode("utf-8"))
+        # Paste as soon as the compositor announces our text as the selection;
+        # without the watcher, give wl-copy a fixed head start instead
+        if not self.clipboard.active or self.clipboard.wait_for_content(0.5) is None:
+            time.sleep(0.1)
 
+        # A single key needs no hold: same frame as fix_last_word's burst
+        os.write(self.ui.fd, BACKSPACE_FRAME)
         self.release_all_modifiers()
-        time.sleep(0.05)
         self.send_combo(e.KEY_LEFTCTRL, e.KEY_V)
 
-        if mode == "last_word":
-            logger.info("Switching system layout...")
-            time.sleep(0.1)
-            self.send_combo(*LAYOUT_SWITCH_COMBO)
+    @property
+    def shift_pressed(self):
+        # Either Shift: releasing one while the other is held keeps letters shifted
+        return (self.held_modifiers & SHIFT_MASK) != 0
+
+    # Handlers get the raw record fields: key values are 0 = release,
+    # 1 = press, 2 = autorepeat; sec/usec is the kernel's event timestamp
+    def _track_modifier(self, code, value):
+        # 0 for keys outside TRACKED_MODIFIERS (e.g. a remapped trigger_btn)
+        bit = MODIFIER_BITS.get(code, 0)
+        if value:
+            self.held_modifiers |= bit
+        else:
+            self.held_modifiers &= ~bit
+
+    def _on_modifier(self, code, value, sec, usec):
+        self._track_modifier(code, value)
+        self._on_key(code, value, sec, usec)
+
+    def _on_shift(self, code, value, sec, usec):
+        self._track_modifier(code, value)
+        if value == 1:
+            self.last_press_time = 0
+
+    def _on_mode2_modifier(self, code, value, sec, usec):
+        self._track_modifier(code, value)
+        self.modifier_down = value != 0
+        if self.modifier_down:
+            self.input_buffer.add(code, self.shift_pressed)
+
+    def _on_key(self, code, value, sec, usec):
+        if value != 0:
+            if value == 1:
+                self.last_press_time = 0
+            if self.held_modifiers & CHORD_MASK:
+                # A shortcut may have changed the text (Ctrl+V, Ctrl+Z...)
+                self.input_buffer.clear()
+            else:
+                self.input_buffer.add(code, self.shift_pressed)
+
+    def _on_trigger(self, code, value, sec, usec):
+        self._track_modifier(code, value)
+
+        # Presses first: autorepeat (2) falls through both branches
+        if value == 1:
+            if self.modifier_down:
+                logger.info("✨ Mode 2: Selection Fix")
+                self.fix_selection()
+                self.last_press_time = 0
+            else:
+                # When the key went down, not when we got to it; CLOCK_MONOTONIC
+                # (see use_monotonic_timestamps), integer math only
+                now = sec * 1_000_000_000 + usec * 1000
+                # Only trigger if key was actually released between presses
+                if self.trigger_released and now - self.last_press_time < DOUBLE_PRESS_DELAY_NS:
+                    logger.info("⚡ Mode 1: Double Shift")
+                    self.fix_last_word()
+                    self.last_press_time = 0
+                else:
+                    self.last_press_time = now
+            self.trigger_released = False
+
+        # Release event validates the next double-press
+        elif value == 0:
+            self.trigger_released = True
+
+    def raise_priority(self):
+        """Best effort: wake up for keystrokes ahead of unrelated CPU load."""
+        # Lowest real-time priority; RESET_ON_FORK keeps wl-copy/wl-paste
+        # children on the normal scheduler. Needs CAP_SYS_NICE or RLIMIT_RTPRIO.
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO | os.SCHED_RESET_ON_FORK, os.sched_param(1))
+            logger.info("⏱️ Real-time scheduling enabled")
+            return
+        except (AttributeError, OSError):
+            pass
+        # Nice values are inherited with no reset-on-fork, so children get the
+        # old one back before exec
+        try:
+            base = os.getpriority(os.PRIO_PROCESS, 0)
+            os.nice(-10)
+            self.child_preexec = partial(os.setpriority, os.PRIO_PROCESS, 0, base)
+        except OSError:
+            logger.debug("No permission to raise scheduling priority, running at default")
 
     def run(self):
         logger.info(f"🚀 SkySwitcher v{VERSION} running...")
+        self.raise_priority()
+
+        # Drain every queued event per wakeup instead of one InputEvent per iteration
+        poller = select.epoll()
+        poller.register(self.device.fd, select.EPOLLIN)
+        # Also consume the clipboard watcher between corrections: an unread
+        # pipe fills up and blocks wl-paste, and old copies would then
+        # surface as if they were the selection we just copied
+        clip_fd = self.clipboard.register(poller)
+        DeviceManager.mask_non_key_events(self.device)
+        DeviceManager.use_monotonic_timestamps(self.device)
+        # Hot-loop names bound to locals (LOAD_FAST instead of global/attr lookups)
+        fd = self.device.fd
+        read = os.read
+        poll = poller.poll
+        iter_unpack = INPUT_EVENT.iter_unpack
+        read_size = INPUT_EVENT.size * EVENT_BATCH_SIZE
+        ev_key = e.EV_KEY
+        handlers_get = self._handlers.get
+        on_key = self._on_key
+
+        # Session logout sends SIGTERM; exit through the finally block below so
+        # the epoll fd and the wl-paste watcher are cleaned up
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
         try:
-            self.device.grab()
-            self.device.ungrab()
-        except Exception:
-            logger.warning("⚠️ Device grabbed. Running passive.")
+            while True:
+                for ready_fd, _ in poll():
+                    if ready_fd == clip_fd:
+                        self.clipboard.pump()
+                        if not self.clipboard.active:
+                            clip_fd = None  # Closing the fd removed it from epoll
+                        continue
 
-        try:
-            for event in self.device.read_loop():
-                if event.type == e.EV_KEY:
-
-                    if event.code == self.mode2_modifier:
-                        self.modifier_down = (event.value == 1 or event.value == 2)
-
-                    if event.code == self.trigger_btn:
-                        # Handle Release event to validate double-press
-                        if event.value == 0:
-                            self.trigger_released = True
-
-                        elif event.value == 1:
-                            if self.modifier_down:
-                                logger.info("✨ Mode 2: Selection Fix")
-                                self.process_correction(mode="selection")
-                                self.last_press_time = 0
-                                self.trigger_released = False
-                            else:
-                                now = time.time()
-                                # Only trigger if key was actually released between presses
-                                if (now - self.last_press_time < DOUBLE_PRESS_DELAY) and self.trigger_released:
-                                    logger.info("⚡ Mode 1: Double Shift")
-                                    self.process_correction(mode="last_word")
-                                    self.last_press_time = 0
-                                    self.trigger_released = False
-                                else:
-                                    self.last_press_time = now
-                                    self.trigger_released = False
-
-                    elif event.value == 1 and event.code != self.mode2_modifier:
-                        if self.last_press_time > 0:
-                            self.last_press_time = 0
+                    try:
+                        data = read(fd, read_size)
+                    except BlockingIOError:
+                        continue
+
+                    for sec, usec, ev_type, code, value in iter_unpack(data):
+                        if ev_type != ev_key:
+                            continue
+
+                        handlers_get(code, on_key)(code, value, sec, usec)
 
         except KeyboardInterrupt:
             print("\n🛑 Stopped by user.")
         except OSError as err:
             logger.error(f"❌ Device error: {err}")
+        finally:
+            poller.close()
+            self.clipboard.close()
+
+
+def seconds(value):
+    """argparse type for delay flags: a finite, non-negative float."""
+    # Caught here, not mid-correction: sleep() raises on negatives, hangs on inf
+    try:
+        delay = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid number of seconds: {value!r}")
+    if not math.isfinite(delay) or delay < 0:
+        raise argparse.ArgumentTypeError(f"must be a finite, non-negative number of seconds: {value!r}")
+    return delay
 
 
 if __name__ == "__main__":
@@ -328,6 +913,16 @@ if __name__ == "__main__":
     parser.add_argument("-d", "--device", help="Path to input device (e.g. /dev/input/eventX)")
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose logging")
     parser.add_argument("--list", action="store_true", help="List available devices")
+    parser.add_argument("--settle-delay", type=seconds, default=SETTLE_DELAY, metavar="SEC",
+                        help="Pause between correction steps, for apps that drop fast input (default: %(default)s)")
+    parser.add_argument("--press-duration", type=seconds, metavar="SEC",
+                        help=f"How long shortcut combos (layout switch, copy, paste) are held (default: {COMBO_HOLD_TIME})")
+    parser.add_argument("--settle-time", type=seconds, metavar="SEC",
+                        help=f"Wait after switching layout before retyping (default: {LAYOUT_SWITCH_SETTLE_TIME})")
+    parser.add_argument("--replay-delay", type=seconds, default=REPLAY_DELAY, metavar="SEC",
+                        help="Pause between retyped keys, for apps that drop bursts (default: %(default)s)")
+    parser.add_argument("--fast", action="store_true",
+                        help="Shorter combo hold and layout settle time; explicit flags still win")
 
     args = parser.parse_args()
 
@@ -342,5 +937,17 @@ if __name__ == "__main__":
     else:
         logger.setLevel(logging.WARNING)  # Show only Warnings/Errors if not verbose
 
+    # 3. Resolve timings: explicit flags > --fast preset > defaults
+    press_duration, switch_settle_time = (
+        (FAST_COMBO_HOLD_TIME, FAST_LAYOUT_SWITCH_SETTLE_TIME) if args.fast
+        else (COMBO_HOLD_TIME, LAYOUT_SWITCH_SETTLE_TIME)
+    )
+    if args.press_duration is not None:
+        press_duration = args.press_duration
+    if args.settle_time is not None:
+        switch_settle_time = args.settle_time
+
     # 4. Run
-    SkySwitcher(device_path=args.device).run()
+    SkySwitcher(device_path=args.device, settle_delay=args.settle_delay,
+                press_duration=press_duration, switch_settle_time=switch_settle_time,
+                replay_delay=args.replay_delay).run()